@@ -0,0 +1,105 @@
+import struct
+
+# tick, source_id, target_id, event_type
+EVENT_STRUCT = struct.Struct("<IqqB")
+# individual was already infected when the simulation started, it has no source
+EVENT_SEED = 0
+# ZZ -> Z or ZD -> Z after contact with the source
+EVENT_INFECTION = 1
+# Z -> C after contact with the source
+EVENT_ESCALATION = 2
+# target was born to the source, one event is logged per parent
+EVENT_BIRTH = 3
+NO_SOURCE = -1
+# number of events kept in memory before they are written to the file
+EVENT_BUFFER_SIZE = 4096
+
+
+class EventLog:
+    """Append-only binary log of (tick, source_id, target_id, event_type) records."""
+
+    def __init__(self, path, buffer_size=EVENT_BUFFER_SIZE):
+        self.file = open(path, "wb")
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        self.num_buffered = 0
+
+    def log(self, tick, source_id, target_id, event_type):
+        self.buffer += EVENT_STRUCT.pack(tick, source_id, target_id, event_type)
+        self.num_buffered += 1
+
+        if self.num_buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write(self.buffer)
+            self.file.flush()
+            self.buffer = bytearray()
+            self.num_buffered = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_events(path, chunk_size=EVENT_BUFFER_SIZE):
+    """Yield the (tick, source_id, target_id, event_type) records of a log file."""
+
+    with open(path, "rb") as file:
+        while True:
+            chunk = file.read(EVENT_STRUCT.size * chunk_size)
+            if not chunk:
+                break
+
+            # ignore a partially written record at the end of the file
+            chunk = chunk[: len(chunk) - len(chunk) % EVENT_STRUCT.size]
+            yield from EVENT_STRUCT.iter_unpack(chunk)
+
+
+def build_transmission_tree(events, event_types=(EVENT_SEED, EVENT_INFECTION)):
+    """Return a mapping of source_id -> list of target ids.
+
+    Seeds are children of NO_SOURCE, so the default tree is rooted there.
+    Pass event_types=(EVENT_BIRTH,) to get the family tree instead.
+    """
+
+    tree = {}
+    for _, source_id, target_id, event_type in events:
+        if event_type in event_types:
+            tree.setdefault(source_id, []).append(target_id)
+
+    return tree
+
+
+def effective_reproduction_number(events):
+    """Return a mapping of tick -> mean number of secondary infections.
+
+    Every infection starts a new episode of the target; the secondary infections
+    of a source are attributed to its latest episode and averaged over all
+    episodes that started on the same tick.
+    """
+
+    episode_start = {}
+    episodes = {}
+    secondary = {}
+    for tick, source_id, target_id, event_type in events:
+        if event_type not in (EVENT_SEED, EVENT_INFECTION):
+            continue
+
+        if source_id in episode_start:
+            source_tick = episode_start[source_id]
+            secondary[source_tick] = secondary.get(source_tick, 0) + 1
+
+        episode_start[target_id] = tick
+        episodes[tick] = episodes.get(tick, 0) + 1
+
+    return {
+        tick: secondary.get(tick, 0) / count for tick, count in sorted(episodes.items())
+    }
@@ -1,10 +1,20 @@
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-from matplotlib.animation import FuncAnimation
+import math
 import random
 import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import count
 
-random.seed(212112)
+from event_log import (
+    EVENT_BIRTH,
+    EVENT_ESCALATION,
+    EVENT_INFECTION,
+    EVENT_SEED,
+    NO_SOURCE,
+)
+
+RANDOM_SEED = 212112
+random.seed(RANDOM_SEED)
 
 # CONSTANTS
 GRID_WIDTH = 100
@@ -24,24 +34,214 @@ STATE_MAX_DURATIONS = {"Z": 2, "C": 7, "ZD": 5, "ZZ": -1}
 INFECTION_RADIUS = 2
 # probability of giving birth to one child, rate is halved for second child
 BIRTH_RATE = 0.1
+# daily immunity change of an individual in the given state
+STATE_IMMUNITY_DIFFS = {"C": -0.5, "Z": -0.1, "ZD": 0.1, "ZZ": 0.05}
+# hybrid mode - healthy individuals with maximum immunity, in regions that no infected,
+# ill or convalescing individual can reach, are kept as cohorts binned by region, age
+# and immunity
+COHORT_COMPRESSION = False
+# side length of the square grid region in which cohorts are kept
+COHORT_REGION_SIZE = 10
+# "sequential" - pairs mutate the individuals one after another
+# "two_phase" - effects of all pairs are gathered first and then combined per individual,
+# the result does not depend on the number of workers
+INTERACTION_MODE = "sequential"
+# workers gathering the effects in the "two_phase" mode
+INTERACTION_WORKERS = 1
+# "thread" or "process"
+INTERACTION_EXECUTOR = "thread"
+# once nobody is infected, ill or convalescing and everybody has maximum immunity,
+# skip the days on which only age and position can change
+ADAPTIVE_STEPPING = False
+# the more severe state wins when an individual is infected by several others at once
+STATE_SEVERITY = {"ZZ": 0, "ZD": 1, "Z": 2, "C": 3}
 # do not change the following two lines
 STATE_VALUES = tuple(STATE_COLORS.keys())
 MIN_FLOAT = sys.float_info.min
+# ids of individuals created outside of a Simulation, which has its own counter
+INDIVIDUAL_IDS = count()
 
 
 # FUNCTIONS
-def get_random_direction(current_direction=None):
+def get_random_direction(current_direction=None, rng=random):
     directions = [(0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (-1, 1), (1, -1), (-1, -1)]
     if current_direction is not None:
         directions.remove(current_direction)
 
-    return random.choice(directions)
+    return rng.choice(directions)
 
 
 def calculate_distance(x1, y1, x2, y2):
     return max(x1 - x2, y1 - y2)
 
 
+def get_max_immunity(age):
+    if age < 15 or age >= 70:
+        return 3
+    elif 40 <= age < 70:
+        return 6
+    elif 15 <= age < 40:
+        return 10
+
+
+def propose_effects(snapshot, rows, seed):
+    """Return the effects of all in-range pairs whose first individual is in rows.
+
+    snapshot holds (id, x_pos, y_pos, state, immunity, immunity_category, age,
+    direction) tuples and is never modified. Each effect is a (target_id, kind, value, source_id)
+    tuple. Random decisions use a generator seeded by the pair, so the effects do
+    not depend on which worker gathers them.
+    """
+
+    effects = []
+    for i in rows:
+        individual_id, x_pos, y_pos, state, immunity, category, age, direction = (
+            snapshot[i]
+        )
+        for other in snapshot[i + 1 :]:
+            other_id, other_x_pos, other_y_pos, other_state = other[:4]
+            other_immunity, other_category, other_age = other[4:7]
+
+            distance = calculate_distance(x_pos, y_pos, other_x_pos, other_y_pos)
+            if distance > INFECTION_RADIUS:
+                continue
+
+            rng = None
+            if abs(x_pos - other_x_pos) <= 0 and abs(y_pos - other_y_pos) <= 0:
+                rng = random.Random(f"{seed}:{individual_id}:{other_id}")
+                new_direction = get_random_direction(direction, rng)
+                effects.append((individual_id, "direction", new_direction, other_id))
+                effects.append(
+                    (
+                        other_id,
+                        "direction",
+                        get_random_direction(new_direction, rng),
+                        individual_id,
+                    )
+                )
+
+            if state == "ZZ" and other_state == "Z":
+                if category == "low":
+                    effects.append((individual_id, "state", "Z", other_id))
+            elif state == "ZZ" and other_state == "C":
+                if category in ("low", "medium"):
+                    effects.append((individual_id, "state", "Z", other_id))
+                elif category == "high":
+                    effects.append((individual_id, "immunity", -3, other_id))
+            elif state == "ZZ" and other_state == "ZD":
+                effects.append((other_id, "immunity", 1, individual_id))
+            elif state == "ZZ" and other_state == "ZZ":
+                shared_immunity = max(immunity, other_immunity)
+                effects.append((individual_id, "immunity", shared_immunity, other_id))
+                effects.append((other_id, "immunity", shared_immunity, individual_id))
+            elif state == "C" and other_state == "Z":
+                if other_category in ("low", "medium"):
+                    effects.append((other_id, "state", "C", individual_id))
+                effects.append((individual_id, "reset", None, other_id))
+            elif state == "C" and other_state == "ZD":
+                if other_category in ("low", "medium"):
+                    effects.append((other_id, "state", "Z", individual_id))
+            elif state == "C" and other_state == "C":
+                shared_immunity = min(immunity, other_immunity)
+                effects.append((individual_id, "immunity", shared_immunity, other_id))
+                effects.append((other_id, "immunity", shared_immunity, individual_id))
+                effects.append((individual_id, "reset", None, other_id))
+                effects.append((other_id, "reset", None, individual_id))
+            elif state == "Z" and other_state == "ZD":
+                effects.append((other_id, "immunity", -1, individual_id))
+
+            # reproduction
+            if 20 <= age <= 40 and 20 <= other_age <= 40:
+                if rng is None:
+                    rng = random.Random(f"{seed}:{individual_id}:{other_id}")
+
+                if rng.random() < BIRTH_RATE:
+                    position = (x_pos, y_pos)
+                    effects.append((individual_id, "birth", position, other_id))
+
+                    if rng.random() < BIRTH_RATE / 2:
+                        effects.append((individual_id, "birth", position, other_id))
+
+    return effects
+
+
+def advance_immunity(immunity, age, ticks):
+    """Return the immunity of a healthy individual of the given age after ticks days."""
+
+    day = 1
+    while day <= ticks:
+        # the maximum immunity only changes at these ages
+        last_day = ticks
+        for boundary_age in (15, 40, 70):
+            if boundary_age > age + day:
+                last_day = min(ticks, boundary_age - age - 1)
+                break
+
+        immunity = min(
+            immunity + STATE_IMMUNITY_DIFFS["ZZ"] * (last_day - day + 1),
+            get_max_immunity(age + day),
+        )
+        day = last_day + 1
+
+    return immunity
+
+
+def move_axis(
+    position, direction, speed, low_bound, low_reset, high_bound, low_inclusive
+):
+    """Return the position and direction along one axis after one day.
+
+    Mirrors Individual.update_position with the same floating point operations,
+    so the result is bit-identical.
+    """
+
+    position += speed * direction
+
+    if position <= low_bound if low_inclusive else position < low_bound:
+        position, direction = low_reset, 1
+    elif position >= high_bound:
+        position, direction = high_bound, -1
+
+    return position, direction
+
+
+def move_position(x_pos, x_direction, y_pos, y_direction, speed):
+    """Return the position and direction of an individual after one day."""
+
+    x_pos, x_direction = move_axis(
+        x_pos,
+        x_direction,
+        speed,
+        DOT_SIZE,
+        DOT_SIZE,
+        GRID_WIDTH - DOT_SIZE,
+        low_inclusive=True,
+    )
+    # the lower wall is only hit below -DOT_SIZE, as in update_position
+    y_pos, y_direction = move_axis(
+        y_pos,
+        y_direction,
+        speed,
+        -DOT_SIZE,
+        DOT_SIZE,
+        GRID_HEIGHT - DOT_SIZE,
+        low_inclusive=False,
+    )
+
+    return x_pos, x_direction, y_pos, y_direction
+
+
+def get_region(x_pos, y_pos):
+    """Return the cohort region containing the given position."""
+
+    max_region_x = (GRID_WIDTH - 1) // COHORT_REGION_SIZE
+    max_region_y = (GRID_HEIGHT - 1) // COHORT_REGION_SIZE
+    region_x = min(max(int(x_pos // COHORT_REGION_SIZE), 0), max_region_x)
+    region_y = min(max(int(y_pos // COHORT_REGION_SIZE), 0), max_region_y)
+
+    return region_x, region_y
+
+
 # CLASSES
 class Individual:
     def __init__(
@@ -50,7 +250,9 @@ class Individual:
         individual_max_age=MAX_AGE,
         parent_x_pos=None,
         parent_y_pos=None,
+        individual_id=None,
     ):
+        self.id = next(INDIVIDUAL_IDS) if individual_id is None else individual_id
         # self.x_pos = random.randint(0, GRID_WIDTH)
         # self.y_pos = random.randint(0, GRID_HEIGHT)
         self.x_pos = random.uniform(DOT_SIZE, GRID_WIDTH - DOT_SIZE)
@@ -151,14 +353,7 @@ class Individual:
 
         # Update the immunity of the individual
         if val is None:
-            if self.state == "Z":
-                immunity_diff = -0.1
-            elif self.state == "C":
-                immunity_diff = -0.5
-            elif self.state == "ZD":
-                immunity_diff = 0.1
-            elif self.state == "ZZ":
-                immunity_diff = 0.05
+            immunity_diff = STATE_IMMUNITY_DIFFS[self.state]
         else:
             # if the value is provided from the outside (Simulation)
             immunity_diff = val
@@ -182,12 +377,7 @@ class Individual:
         self.update_state()
 
     def get_max_immunity(self):
-        if self.age < 15 or self.age >= 70:
-            return 3
-        elif 40 <= self.age < 70:
-            return 6
-        elif 15 <= self.age < 40:
-            return 10
+        return get_max_immunity(self.age)
 
     def get_immunity_category(self):
         if self.immunity <= 3:
@@ -203,16 +393,58 @@ class Individual:
     def is_alive(self):
         return self.isAlive
 
+    def is_compressible(self):
+        """Return whether the individual can be kept in a cohort."""
+
+        # individuals of reproductive age stay explicit so that births are not lost
+        return (
+            self.state == "ZZ"
+            and self.immunity >= self.get_max_immunity()
+            and not 20 <= self.age <= 40
+        )
+
 
 class Simulation:
-    def __init__(self, num_ticks=100):
+    def __init__(
+        self,
+        num_ticks=100,
+        compress_cohorts=COHORT_COMPRESSION,
+        event_log=None,
+        interaction_mode=INTERACTION_MODE,
+        num_workers=INTERACTION_WORKERS,
+        executor=INTERACTION_EXECUTOR,
+        seed=RANDOM_SEED,
+        adaptive_stepping=ADAPTIVE_STEPPING,
+        num_individuals=NUM_INDIVIDUALS,
+    ):
         # 1 tick = 1 day
         self.current_tick = 0
         self.num_ticks = num_ticks
+        # ids seed the random decisions of pairs, so every simulation counts from 0
+        self.individual_ids = count()
         self.individuals = [
-            Individual(birth=False, individual_max_age=60)
-            for _ in range(NUM_INDIVIDUALS)
+            Individual(
+                birth=False,
+                individual_max_age=60,
+                individual_id=next(self.individual_ids),
+            )
+            for _ in range(num_individuals)
         ]
+        self.compress_cohorts = compress_cohorts
+        # (region_x, region_y, age, immunity) -> array of individual ids
+        self.cohorts = {}
+        self.event_log = event_log
+        self.interaction_mode = interaction_mode
+        self.num_workers = num_workers
+        self.executor = executor
+        self.seed = seed
+        # started on the first day with several workers, stopped by finish()
+        self.pool = None
+        self.adaptive_stepping = adaptive_stepping
+
+        for individual in self.individuals:
+            if individual.state in ("Z", "C"):
+                self.log_event(NO_SOURCE, individual.id, EVENT_SEED)
 
     def update(self):
         self.current_tick += 1
@@ -220,21 +452,306 @@ class Simulation:
         for individual in self.individuals:
             individual.update()
 
+        if self.compress_cohorts:
+            self.update_cohorts()
+
         self.remove_dead_individuals()
-        self.check_interactions()
 
-    def start(self, ax=None):
-        for _ in range(self.num_ticks):
-            self.update()
+        if self.compress_cohorts:
+            self.rebalance_cohorts()
 
-            if ax is not None:
+        if self.interaction_mode == "two_phase":
+            self.check_interactions_two_phase()
+        else:
+            self.check_interactions()
+
+    def start(self, ax=None):
+        ticks = 0
+        while ticks < self.num_ticks:
+            # drawing needs every day, so days are only skipped without it
+            if ax is None:
+                ticks += self.advance(self.num_ticks - ticks)
+            else:
+                ticks += self.advance()
                 self.draw(ax)
 
+        self.finish()
+
+    def finish(self):
+        """Flush the event log and stop the interaction workers.
+
+        start() calls it, callers of update() or advance() call it themselves or use
+        the simulation as a context manager.
+        """
+
+        if self.event_log is not None:
+            self.event_log.flush()
+
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.finish()
+
+    def advance(self, max_ticks=1):
+        """Advance the simulation by up to max_ticks days and return the number of days."""
+
+        if self.adaptive_stepping and self.is_quiescent():
+            ticks = self.get_quiescent_ticks(max_ticks)
+            ticks, positions = self.get_meeting_free_positions(ticks)
+            if ticks > 1:
+                self.skip_quiescent_ticks(ticks, positions)
+                return ticks
+
+        self.update()
+        return 1
+
+    def is_quiescent(self):
+        # cohorts only hold healthy individuals
+        return all(individual.state == "ZZ" for individual in self.individuals)
+
+    def get_quiescent_ticks(self, max_ticks):
+        """Return the number of days, up to max_ticks, on which nothing but age and
+        position can change.
+
+        Infections cannot come back once everybody is healthy, so the interactions
+        left are reproduction, which needs two individuals of age 20-40, and sharing
+        immunity between healthy individuals. Sharing changes nothing while every
+        explicit individual has maximum immunity, which lasts until somebody turns 15
+        and their maximum goes up. With compression, the days end before somebody is
+        compressed or expanded.
+        """
+
+        ages = []
+        for individual in self.individuals:
+            # sharing immunity still changes somebody, or a compression is due
+            if individual.immunity < individual.get_max_immunity() or (
+                self.compress_cohorts and individual.is_compressible()
+            ):
+                return 0
+
+            if individual.age < 15:
+                max_ticks = min(max_ticks, 14 - individual.age)
+            elif self.compress_cohorts:
+                # everybody else left explicit is 20-40 and gets compressed at 41
+                max_ticks = min(max_ticks, 40 - individual.age)
+            ages.append((individual.age, 1))
+
+        for (_, _, age, _), ids in self.cohorts.items():
+            # expanded at 20
+            if age < 20:
+                max_ticks = min(max_ticks, 19 - age)
+            ages.append((age, len(ids)))
+
+        # (first day, last day, number of individuals) of reproductive age
+        intervals = []
+        for age, num_individuals in ages:
+            first_day = max(20 - age, 1)
+            last_day = min(40 - age, MAX_AGE - 1 - age)
+            if first_day <= last_day:
+                intervals.append((first_day, last_day, num_individuals))
+
+        last_day_seen = 0
+        for first_day, last_day, num_individuals in sorted(intervals):
+            if first_day > max_ticks:
+                break
+            if num_individuals > 1 or last_day_seen >= first_day:
+                return first_day - 1
+            last_day_seen = max(last_day_seen, last_day)
+
+        return max_ticks
+
+    def get_meeting_free_positions(self, max_ticks):
+        """Return the number of days, up to max_ticks, before two individuals meet,
+        and the (individual, speed, x_pos, x_direction, y_pos, y_direction) of the
+        individuals still alive after that many days.
+
+        Individuals at exactly the same position change their direction at random.
+        Walls put individuals on a common lattice, so such meetings are not rare.
+        They can only be found day by day, but a set lookup per individual is much
+        cheaper than checking every pair.
+        """
+
+        positions = [
+            (
+                individual,
+                individual.speed,
+                individual.x_pos,
+                individual.x_direction,
+                individual.y_pos,
+                individual.y_direction,
+            )
+            for individual in self.individuals
+        ]
+        for day in range(1, max_ticks + 1):
+            occupied = set()
+            moved = []
+            for individual, speed, x_pos, x_direction, y_pos, y_direction in positions:
+                # dead individuals are removed before the interactions
+                if individual.age + day >= MAX_AGE:
+                    continue
+
+                x_pos, x_direction, y_pos, y_direction = move_position(
+                    x_pos, x_direction, y_pos, y_direction, speed
+                )
+                if (x_pos, y_pos) in occupied:
+                    return day - 1, positions
+
+                occupied.add((x_pos, y_pos))
+                moved.append(
+                    (individual, speed, x_pos, x_direction, y_pos, y_direction)
+                )
+
+            positions = moved
+
+        return max_ticks, positions
+
+    def skip_quiescent_ticks(self, ticks, positions):
+        """Advance a quiescent simulation by ticks days at once.
+
+        Ages, deaths at MAX_AGE and immunity are computed in closed form, positions
+        come from get_meeting_free_positions. Everybody explicit stays at maximum
+        immunity, so sharing it changes nothing. Cohorts are aged day by day, which
+        is cheap and keeps their immunity identical to daily stepping.
+        """
+
+        self.current_tick += ticks
+
+        for individual in self.individuals:
+            if individual.age + ticks >= MAX_AGE:
+                individual.isAlive = False
+                continue
+
+            individual.immunity = advance_immunity(
+                individual.immunity, individual.age, ticks
+            )
+            individual.age += ticks
+
+        for individual, _, x_pos, x_direction, y_pos, y_direction in positions:
+            individual.x_pos, individual.x_direction = x_pos, x_direction
+            individual.y_pos, individual.y_direction = y_pos, y_direction
+
+        for _ in range(ticks):
+            self.update_cohorts()
+
+        self.remove_dead_individuals()
+
+    def log_event(self, source_id, target_id, event_type):
+        if self.event_log is not None:
+            self.event_log.log(self.current_tick, source_id, target_id, event_type)
+
     def remove_dead_individuals(self):
         self.individuals = [
             individual for individual in self.individuals if individual.is_alive()
         ]
 
+    def get_population(self):
+        return len(self.individuals) + sum(map(len, self.cohorts.values()))
+
+    def update_cohorts(self):
+        """Age the cohorts and update their immunity, the same way as Individual.update does."""
+
+        cohorts = {}
+        for (region_x, region_y, age, immunity), ids in self.cohorts.items():
+            age += 1
+
+            # the whole cohort dies at once
+            if age >= MAX_AGE:
+                continue
+
+            immunity = min(
+                immunity + STATE_IMMUNITY_DIFFS["ZZ"], get_max_immunity(age)
+            )
+            key = (region_x, region_y, age, immunity)
+            if key in cohorts:
+                cohorts[key].extend(ids)
+            else:
+                cohorts[key] = ids
+
+        self.cohorts = cohorts
+
+    def expand_cohort(self, key, ids):
+        """Turn a cohort back into explicit individuals placed randomly in its region."""
+
+        region_x, region_y, age, immunity = key
+        min_x = max(region_x * COHORT_REGION_SIZE, DOT_SIZE)
+        max_x = min((region_x + 1) * COHORT_REGION_SIZE, GRID_WIDTH - DOT_SIZE)
+        min_y = max(region_y * COHORT_REGION_SIZE, DOT_SIZE)
+        max_y = min((region_y + 1) * COHORT_REGION_SIZE, GRID_HEIGHT - DOT_SIZE)
+
+        for individual_id in ids:
+            individual = Individual(
+                birth=True,
+                parent_x_pos=random.uniform(min_x, max_x),
+                parent_y_pos=random.uniform(min_y, max_y),
+                individual_id=individual_id,
+            )
+            individual.age = age
+            individual.immunity = immunity
+            self.individuals.append(individual)
+
+    def get_reachable_rows(self):
+        """Return region_x -> highest region_y within reach of a Z, C or ZD individual.
+
+        A healthy individual is only affected by a pair in which it comes first and
+        the Z, C or ZD individual second. calculate_distance is one-sided, so it then
+        lies at most INFECTION_RADIUS to the right of and above the other one. Widened
+        by the highest speed, that reach covers every region down and to the left of
+        a Z, C or ZD individual, regions up and to the right of all of them are safe.
+        """
+
+        margin = INFECTION_RADIUS + max(SPEED_VALUES)
+        reachable_rows = {}
+        for individual in self.individuals:
+            if individual.state == "ZZ":
+                continue
+
+            max_region_x, max_region_y = get_region(
+                individual.x_pos + margin, individual.y_pos + margin
+            )
+            for region_x in range(max_region_x + 1):
+                reachable_rows[region_x] = max(
+                    reachable_rows.get(region_x, -1), max_region_y
+                )
+
+        return reachable_rows
+
+    def rebalance_cohorts(self):
+        """Expand the cohorts in regions a Z, C or ZD individual can reach and
+        compress the healthy individuals with maximum immunity outside of them.
+
+        Nobody in a cohort could have been infected, so compression does not change
+        the course of the epidemic. It is approximate in other ways: cohorts do not
+        share immunity with, or change direction on meeting, explicit individuals,
+        and expanded individuals get a random position, speed and direction in their
+        region.
+        """
+
+        reachable_rows = self.get_reachable_rows()
+
+        for key in list(self.cohorts):
+            region_x, region_y, age, _ = key
+            if region_y <= reachable_rows.get(region_x, -1) or 20 <= age <= 40:
+                self.expand_cohort(key, self.cohorts.pop(key))
+
+        individuals = []
+        for individual in self.individuals:
+            region_x, region_y = get_region(individual.x_pos, individual.y_pos)
+            if (
+                individual.is_compressible()
+                and region_y > reachable_rows.get(region_x, -1)
+            ):
+                key = (region_x, region_y, individual.age, individual.immunity)
+                self.cohorts.setdefault(key, array("q")).append(individual.id)
+            else:
+                individuals.append(individual)
+
+        self.individuals = individuals
+
     def check_interactions(self):
         for i, individual in enumerate(self.individuals):
             # so that we don't check the same pair twice
@@ -284,10 +801,16 @@ class Simulation:
                     if individual_immunity_category == "low":
                         individual.state = "Z"
                         individual.reset_state_duration()
+                        self.log_event(
+                            other_individual.id, individual.id, EVENT_INFECTION
+                        )
                 elif individual.state == "ZZ" and other_individual.state == "C":
                     if individual_immunity_category in ("low", "medium"):
                         individual.state = "Z"
                         individual.reset_state_duration()
+                        self.log_event(
+                            other_individual.id, individual.id, EVENT_INFECTION
+                        )
                     elif individual_immunity_category == "high":
                         individual.update_immunity(-3)
                 elif individual.state == "ZZ" and other_individual.state == "ZD":
@@ -300,11 +823,17 @@ class Simulation:
                     if other_individual_immunity_category in ("low", "medium"):
                         other_individual.state = "C"
                         other_individual.reset_state_duration()
+                        self.log_event(
+                            individual.id, other_individual.id, EVENT_ESCALATION
+                        )
                     individual.reset_state_duration()
                 elif individual.state == "C" and other_individual.state == "ZD":
                     if other_individual_immunity_category in ("low", "medium"):
                         other_individual.state = "Z"
                         other_individual.reset_state_duration()
+                        self.log_event(
+                            individual.id, other_individual.id, EVENT_INFECTION
+                        )
                 elif individual.state == "C" and other_individual.state == "C":
                     immunity = min(individual.immunity, other_individual.immunity)
                     individual.update_immunity(immunity)
@@ -322,24 +851,124 @@ class Simulation:
                     and 20 <= other_individual.age <= 40
                     and random.random() < BIRTH_RATE
                 ):
-                    self.individuals.append(
-                        Individual(
-                            birth=True,
-                            parent_x_pos=individual.x_pos,
-                            parent_y_pos=individual.y_pos,
-                        )
-                    )
+                    self.give_birth(individual, other_individual)
 
                     if random.random() < BIRTH_RATE / 2:
-                        self.individuals.append(
-                            Individual(
-                                birth=True,
-                                parent_x_pos=individual.x_pos,
-                                parent_y_pos=individual.y_pos,
-                            )
-                        )
+                        self.give_birth(individual, other_individual)
+
+    def gather_effects(self):
+        """Gather the effects of all in-range pairs without modifying any individual."""
+
+        snapshot = [
+            (
+                individual.id,
+                individual.x_pos,
+                individual.y_pos,
+                individual.state,
+                individual.immunity,
+                individual.get_immunity_category(),
+                individual.age,
+                (individual.x_direction, individual.y_direction),
+            )
+            for individual in self.individuals
+        ]
+        seed = f"{self.seed}:{self.current_tick}"
+
+        if self.num_workers <= 1:
+            return propose_effects(snapshot, range(len(snapshot)), seed)
+
+        if self.pool is None:
+            if self.executor == "process":
+                self.pool = ProcessPoolExecutor(max_workers=self.num_workers)
+            else:
+                self.pool = ThreadPoolExecutor(max_workers=self.num_workers)
+
+        # interleaved rows so that the workers get a similar number of pairs
+        futures = [
+            self.pool.submit(
+                propose_effects,
+                snapshot,
+                range(worker, len(snapshot), self.num_workers),
+                seed,
+            )
+            for worker in range(self.num_workers)
+        ]
+
+        return [effect for future in futures for effect in future.result()]
+
+    def check_interactions_two_phase(self):
+        """Apply the gathered effects combined per individual.
+
+        State changes keep the most severe proposed state, immunity changes are summed
+        exactly, a change of direction comes from the lowest source id and children are
+        born in the order of their parents' ids. None of the rules depends on the order
+        in which the effects were gathered.
+        """
+
+        effects = {}
+        births = []
+        for target_id, kind, value, source_id in self.gather_effects():
+            if kind == "birth":
+                births.append((target_id, source_id, value))
+            else:
+                effects.setdefault(target_id, []).append((kind, value, source_id))
+
+        for individual in self.individuals:
+            if individual.id not in effects:
+                continue
+
+            states = []
+            immunity_diffs = []
+            directions = []
+            reset = False
+            for kind, value, source_id in effects[individual.id]:
+                if kind == "state":
+                    states.append((-STATE_SEVERITY[value], source_id, value))
+                elif kind == "immunity":
+                    immunity_diffs.append(value)
+                elif kind == "direction":
+                    directions.append((source_id, value))
+                elif kind == "reset":
+                    reset = True
+
+            if directions:
+                individual.x_direction, individual.y_direction = min(directions)[1]
+
+            if states:
+                _, source_id, state = min(states)
+                individual.state = state
+                reset = True
+                if state == "C":
+                    self.log_event(source_id, individual.id, EVENT_ESCALATION)
+                else:
+                    self.log_event(source_id, individual.id, EVENT_INFECTION)
+
+            if immunity_diffs:
+                individual.update_immunity(math.fsum(immunity_diffs))
+
+            if reset:
+                individual.reset_state_duration()
+
+        parents = {individual.id: individual for individual in self.individuals}
+        for parent_id, other_parent_id, _ in sorted(births):
+            self.give_birth(parents[parent_id], parents[other_parent_id])
+
+    def give_birth(self, parent, other_parent):
+        child = Individual(
+            birth=True,
+            parent_x_pos=parent.x_pos,
+            parent_y_pos=parent.y_pos,
+            individual_id=next(self.individual_ids),
+        )
+        self.individuals.append(child)
+        self.log_event(parent.id, child.id, EVENT_BIRTH)
+        self.log_event(other_parent.id, child.id, EVENT_BIRTH)
 
     def draw(self, ax):
+        # matplotlib is only needed for drawing, see raster.py for rendering without it
+        import matplotlib.patches as mpatches
+        import matplotlib.pyplot as plt
+
         ax.clear()
         ax.set_xlim(0, GRID_WIDTH)
         ax.set_ylim(0, GRID_HEIGHT)
@@ -354,6 +983,30 @@ class Simulation:
             ax.set_yticklabels([])
             ax.grid(True, alpha=0.5)
 
+        # cohorts have no positions, their regions are shaded by the number of individuals
+        region_counts = {}
+        for (region_x, region_y, _, _), ids in self.cohorts.items():
+            region = (region_x, region_y)
+            region_counts[region] = region_counts.get(region, 0) + len(ids)
+
+        for (region_x, region_y), region_count in region_counts.items():
+            ax.add_patch(
+                mpatches.Rectangle(
+                    (region_x * COHORT_REGION_SIZE, region_y * COHORT_REGION_SIZE),
+                    COHORT_REGION_SIZE,
+                    COHORT_REGION_SIZE,
+                    color=STATE_COLORS["ZZ"],
+                    alpha=min(0.1 + 0.05 * region_count, 0.6),
+                )
+            )
+            ax.text(
+                (region_x + 0.5) * COHORT_REGION_SIZE,
+                (region_y + 0.5) * COHORT_REGION_SIZE,
+                str(region_count),
+                ha="center",
+                va="center",
+            )
+
         for individual in self.individuals:
             ax.add_patch(
                 mpatches.Circle(
@@ -380,6 +1033,8 @@ class Simulation:
 
 
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots(figsize=(10, 10))
 
     sim = Simulation(num_ticks=NUMBER_OF_TICKS)
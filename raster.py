@@ -0,0 +1,179 @@
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from main import (
+    COHORT_REGION_SIZE,
+    DOT_SIZE,
+    GRID_HEIGHT,
+    GRID_WIDTH,
+    NUMBER_OF_TICKS,
+    STATE_COLORS,
+    STATE_VALUES,
+    Simulation,
+)
+
+# CONSTANTS
+RASTER_WIDTH = 500
+RASTER_HEIGHT = 500
+BACKGROUND_COLOR = (255, 255, 255)
+# opacity of a pixel covered by a single individual, denser pixels get more opaque
+MIN_ALPHA = 0.4
+# RGB values of the colour names used in STATE_COLORS
+COLOR_VALUES = {
+    "red": (255, 0, 0),
+    "yellow": (255, 255, 0),
+    "orange": (255, 165, 0),
+    "green": (0, 128, 0),
+}
+STATE_RGB = np.array(
+    [COLOR_VALUES[STATE_COLORS[state]] for state in STATE_VALUES], dtype=np.float64
+)
+
+
+# FUNCTIONS
+def get_state_densities(simulation, width, height):
+    """Return the number of individuals in each state per pixel, shape (states, height, width)."""
+
+    state_indices = {state: index for index, state in enumerate(STATE_VALUES)}
+    x_positions = np.fromiter(
+        (individual.x_pos for individual in simulation.individuals), dtype=np.float64
+    )
+    y_positions = np.fromiter(
+        (individual.y_pos for individual in simulation.individuals), dtype=np.float64
+    )
+    states = np.fromiter(
+        (state_indices[individual.state] for individual in simulation.individuals),
+        dtype=np.int64,
+    )
+
+    columns = np.clip((x_positions * width / GRID_WIDTH).astype(np.int64), 0, width - 1)
+    # y grows upwards on the grid and downwards in the image
+    rows = np.clip(
+        ((GRID_HEIGHT - y_positions) * height / GRID_HEIGHT).astype(np.int64),
+        0,
+        height - 1,
+    )
+    densities = np.bincount(
+        (states * height + rows) * width + columns,
+        minlength=len(STATE_VALUES) * height * width,
+    ).astype(np.float64)
+    densities = densities.reshape(len(STATE_VALUES), height, width)
+
+    # cohorts have no positions, they are spread evenly over their region
+    region_counts = {}
+    for (region_x, region_y, _, _), ids in simulation.cohorts.items():
+        region = (region_x, region_y)
+        region_counts[region] = region_counts.get(region, 0) + len(ids)
+
+    healthy = densities[state_indices["ZZ"]]
+    for (region_x, region_y), count in region_counts.items():
+        min_x = region_x * COHORT_REGION_SIZE
+        max_x = min(min_x + COHORT_REGION_SIZE, GRID_WIDTH)
+        min_y = region_y * COHORT_REGION_SIZE
+        max_y = min(min_y + COHORT_REGION_SIZE, GRID_HEIGHT)
+        first_column = min_x * width // GRID_WIDTH
+        last_column = max_x * width // GRID_WIDTH
+        first_row = (GRID_HEIGHT - max_y) * height // GRID_HEIGHT
+        last_row = (GRID_HEIGHT - min_y) * height // GRID_HEIGHT
+        area = max((last_column - first_column) * (last_row - first_row), 1)
+        healthy[first_row:last_row, first_column:last_column] += count / area
+
+    return densities
+
+
+def spread_dots(densities, radius):
+    """Spread every pixel over a square of the given radius so the dots stay visible."""
+
+    if radius <= 0:
+        return densities
+
+    height, width = densities.shape[1:]
+    padded = np.pad(densities, ((0, 0), (radius, radius), (radius, radius)))
+    spread = np.zeros_like(densities)
+    for row_offset in range(2 * radius + 1):
+        for column_offset in range(2 * radius + 1):
+            spread += padded[
+                :,
+                row_offset : row_offset + height,
+                column_offset : column_offset + width,
+            ]
+
+    return spread
+
+
+def render_frame(simulation, width=RASTER_WIDTH, height=RASTER_HEIGHT):
+    """Return the simulation as a (height, width, 3) uint8 RGB image.
+
+    Pixels shared by many individuals get the mean colour of their states and
+    become more opaque with the logarithm of their density. Apart from collecting
+    the positions, the cost depends only on the image size.
+    """
+
+    densities = get_state_densities(simulation, width, height)
+    densities = spread_dots(densities, int(DOT_SIZE * width / GRID_WIDTH))
+
+    total = densities.sum(axis=0)
+    covered = total > 0
+    colors = np.einsum("shw,sc->hwc", densities, STATE_RGB)
+    colors[covered] /= total[covered, None]
+
+    alpha = np.zeros_like(total)
+    if covered.any():
+        alpha[covered] = MIN_ALPHA + (1 - MIN_ALPHA) * np.log1p(
+            total[covered]
+        ) / np.log1p(total.max())
+
+    image = colors * alpha[..., None] + np.array(BACKGROUND_COLOR) * (
+        1 - alpha[..., None]
+    )
+
+    return np.rint(image).astype(np.uint8)
+
+
+def write_png(path, image):
+    """Write a (height, width, 3) uint8 RGB image as a PNG file."""
+
+    height, width = image.shape[:2]
+    # every scanline starts with filter type 0 (none)
+    scanlines = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    scanlines[:, 1:] = image.reshape(height, width * 3)
+
+    def chunk(chunk_type, data):
+        return (
+            struct.pack(">I", len(data))
+            + chunk_type
+            + data
+            + struct.pack(">I", zlib.crc32(chunk_type + data))
+        )
+
+    with open(path, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        file.write(chunk(b"IDAT", zlib.compress(scanlines.tobytes())))
+        file.write(chunk(b"IEND", b""))
+
+
+def save_frames(simulation, directory, width=RASTER_WIDTH, height=RASTER_HEIGHT):
+    """Run the simulation and write one PNG frame per step into the directory.
+
+    With adaptive stepping, skipped days get no frame.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    ticks = 0
+    while ticks < simulation.num_ticks:
+        ticks += simulation.advance(simulation.num_ticks - ticks)
+        write_png(
+            os.path.join(directory, f"day_{simulation.current_tick:04d}.png"),
+            render_frame(simulation, width, height),
+        )
+
+    simulation.finish()
+
+
+if __name__ == "__main__":
+    sim = Simulation(num_ticks=NUMBER_OF_TICKS)
+    save_frames(sim, "frames")
@@ -0,0 +1,280 @@
+"""Scalability regression harness.
+
+Runs the simulation at geometric population sizes and tick counts, measuring
+time, peak RSS and tracemalloc allocations, fits empirical scaling exponents and
+fails when they, or the bytes per individual, exceed the stored thresholds.
+
+    python scaling.py --report scaling_report.json
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+from main import RANDOM_SEED, Simulation
+
+# CONSTANTS
+POPULATION_SIZES = (50, 100, 200, 400)
+TICK_COUNTS = (2, 4, 8)
+THRESHOLDS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "scaling_thresholds.json"
+)
+REPORT_PATH = "scaling_report.json"
+# In seconds
+RSS_SAMPLING_INTERVAL = 0.01
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+# FUNCTIONS
+def get_rss():
+    """Return the current resident set size in bytes."""
+
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        # ru_maxrss is the peak, in kilobytes on Linux and in bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class RSSSampler(threading.Thread):
+    """Samples the resident set size in the background and keeps the peak."""
+
+    def __init__(self, interval=RSS_SAMPLING_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = get_rss()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, get_rss())
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.peak = max(self.peak, get_rss())
+
+
+def run_simulation(num_individuals, num_ticks, on_tick=None):
+    """Run the simulation and return it with its peak population.
+
+    on_tick is called after every day, while the simulation is still alive.
+    """
+
+    random.seed(RANDOM_SEED)
+    with Simulation(num_ticks=num_ticks, num_individuals=num_individuals) as sim:
+        peak_population = sim.get_population()
+        for _ in range(num_ticks):
+            sim.update()
+            peak_population = max(peak_population, sim.get_population())
+            if on_tick is not None:
+                on_tick()
+
+    return sim, peak_population
+
+
+class BlockCounter:
+    """Counts the memory blocks allocated between calls with tracemalloc snapshots.
+
+    Blocks are compared per source line and only growing lines are counted, so
+    the count is the net number of new blocks, a lower bound on the allocations.
+    """
+
+    def __init__(self):
+        # snapshots are Python objects too, leave out what tracemalloc allocates
+        self.filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        self.snapshot = self.take_snapshot()
+        self.new_blocks = []
+
+    def take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(self.filters)
+
+    def __call__(self):
+        snapshot = self.take_snapshot()
+        self.new_blocks.append(
+            sum(
+                stat.count_diff
+                for stat in snapshot.compare_to(self.snapshot, "lineno")
+                if stat.count_diff > 0
+            )
+        )
+        self.snapshot = snapshot
+
+    def get_live_blocks(self):
+        """Return the number of blocks allocated at the last snapshot."""
+
+        return sum(stat.count for stat in self.snapshot.statistics("filename"))
+
+
+def measure(num_individuals, num_ticks):
+    """Measure one case, meant to run in a fresh process.
+
+    Time and RSS are measured first, tracemalloc slows the simulation down so the
+    traced peak is measured in a second run. Snapshots would add to that peak, so
+    blocks are counted in a third run: new_blocks_per_tick is the mean number of
+    new blocks per day and live_blocks the number of blocks held on the last day,
+    while the simulation is still alive.
+    """
+
+    baseline_rss = get_rss()
+    sampler = RSSSampler()
+    sampler.start()
+    start = time.perf_counter()
+    sim, peak_population = run_simulation(num_individuals, num_ticks)
+    duration = time.perf_counter() - start
+    sampler.stop()
+    del sim
+
+    tracemalloc.start()
+    sim, _ = run_simulation(num_individuals, num_ticks)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del sim
+
+    tracemalloc.start()
+    block_counter = BlockCounter()
+    sim, _ = run_simulation(num_individuals, num_ticks, on_tick=block_counter)
+    live_blocks = block_counter.get_live_blocks()
+    new_blocks_per_tick = sum(block_counter.new_blocks) / num_ticks
+    tracemalloc.stop()
+    del sim
+
+    return {
+        "num_individuals": num_individuals,
+        "num_ticks": num_ticks,
+        "peak_population": peak_population,
+        "seconds": duration,
+        "seconds_per_tick": duration / num_ticks,
+        "peak_rss_bytes": sampler.peak,
+        "rss_growth_bytes": sampler.peak - baseline_rss,
+        "traced_peak_bytes": traced_peak,
+        "live_blocks": live_blocks,
+        "new_blocks_per_tick": new_blocks_per_tick,
+        "bytes_per_individual": traced_peak / peak_population,
+    }
+
+
+def fit_exponent(xs, ys):
+    """Return the slope of the least squares line through (log x, log y)."""
+
+    points = [(math.log(x), math.log(y)) for x, y in zip(xs, ys) if x > 0 and y > 0]
+    if len(points) < 2:
+        return None
+
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if variance == 0:
+        return None
+
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+def get_exponents(cases):
+    """Fit the exponents over population sizes at the most ticks and over ticks at
+    the largest population size.
+
+    Births make the population grow during a run, so the cost is fitted against
+    the peak population instead of the initial one.
+    """
+
+    max_ticks = max(case["num_ticks"] for case in cases)
+    max_size = max(case["num_individuals"] for case in cases)
+    by_size = [case for case in cases if case["num_ticks"] == max_ticks]
+    by_ticks = [case for case in cases if case["num_individuals"] == max_size]
+
+    def fit(cases, x_key, y_key):
+        return fit_exponent(
+            [case[x_key] for case in cases], [case[y_key] for case in cases]
+        )
+
+    return {
+        "seconds_per_tick": fit(by_size, "peak_population", "seconds_per_tick"),
+        "rss_growth": fit(by_size, "peak_population", "rss_growth_bytes"),
+        "traced_peak": fit(by_size, "peak_population", "traced_peak_bytes"),
+        "live_blocks": fit(by_size, "peak_population", "live_blocks"),
+        "new_blocks_per_tick": fit(by_size, "peak_population", "new_blocks_per_tick"),
+        "peak_population": fit(by_size, "num_individuals", "peak_population"),
+        "seconds_over_ticks": fit(by_ticks, "num_ticks", "seconds"),
+        "traced_peak_over_ticks": fit(by_ticks, "num_ticks", "traced_peak_bytes"),
+    }
+
+
+def check_thresholds(report, thresholds):
+    """Return a list of messages for every value over its threshold."""
+
+    failures = []
+    for name, limit in thresholds.get("exponents", {}).items():
+        value = report["exponents"].get(name)
+        if value is not None and value > limit:
+            failures.append(f"exponent {name} = {value:.3f} > {limit}")
+
+    limit = thresholds.get("bytes_per_individual")
+    if limit is not None and report["bytes_per_individual"] > limit:
+        failures.append(
+            f"bytes_per_individual = {report['bytes_per_individual']:.0f} > {limit}"
+        )
+
+    return failures
+
+
+def run(
+    sizes=POPULATION_SIZES, tick_counts=TICK_COUNTS, thresholds_path=THRESHOLDS_PATH
+):
+    cases = []
+    context = multiprocessing.get_context("spawn")
+    for num_ticks in tick_counts:
+        for num_individuals in sizes:
+            # a fresh process per case, so that the peak RSS is not shared between cases
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                case = executor.submit(measure, num_individuals, num_ticks).result()
+            cases.append(case)
+            print(
+                f"{num_individuals:>6} individuals {num_ticks:>4} ticks: "
+                f"{case['seconds_per_tick']:.4f} s/tick, "
+                f"{case['traced_peak_bytes'] / 2**20:.1f} MiB traced, "
+                f"{case['peak_rss_bytes'] / 2**20:.1f} MiB RSS",
+                file=sys.stderr,
+            )
+
+    with open(thresholds_path) as file:
+        thresholds = json.load(file)
+
+    report = {
+        "cases": cases,
+        "exponents": get_exponents(cases),
+        "bytes_per_individual": max(case["bytes_per_individual"] for case in cases),
+        "thresholds": thresholds,
+    }
+    report["failures"] = check_thresholds(report, thresholds)
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=POPULATION_SIZES)
+    parser.add_argument("--ticks", type=int, nargs="+", default=TICK_COUNTS)
+    parser.add_argument("--thresholds", default=THRESHOLDS_PATH)
+    parser.add_argument("--report", default=REPORT_PATH)
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.ticks, args.thresholds)
+    with open(args.report, "w") as file:
+        json.dump(report, file, indent=2)
+
+    for failure in report["failures"]:
+        print(f"FAILED: {failure}", file=sys.stderr)
+
+    sys.exit(1 if report["failures"] else 0)
@@ -0,0 +1,60 @@
+import random
+
+import main
+from event_log import (
+    EVENT_BIRTH,
+    EVENT_INFECTION,
+    EVENT_SEED,
+    NO_SOURCE,
+    EventLog,
+    build_transmission_tree,
+    effective_reproduction_number,
+    read_events,
+)
+
+
+def test_event_log_round_trip(tmp_path):
+    path = tmp_path / "events.bin"
+    events = [
+        (0, NO_SOURCE, 1, EVENT_SEED),
+        (0, NO_SOURCE, 2, EVENT_SEED),
+        (1, 1, 3, EVENT_INFECTION),
+        (1, 1, 4, EVENT_INFECTION),
+        (2, 3, 5, EVENT_INFECTION),
+        (2, 3, 6, EVENT_BIRTH),
+        (2, 4, 6, EVENT_BIRTH),
+    ]
+    with EventLog(path, buffer_size=3) as log:
+        for event in events:
+            log.log(*event)
+
+    assert list(read_events(path, chunk_size=2)) == events
+    assert build_transmission_tree(events) == {NO_SOURCE: [1, 2], 1: [3, 4], 3: [5]}
+    assert build_transmission_tree(events, (EVENT_BIRTH,)) == {3: [6], 4: [6]}
+    assert effective_reproduction_number(events) == {0: 1.0, 1: 0.5, 2: 0.0}
+
+
+def test_simulation_logs_births_and_infections(tmp_path):
+    path = tmp_path / "events.bin"
+    random.seed(3)
+    with EventLog(path) as log:
+        sim = main.Simulation(num_ticks=5, num_individuals=60, event_log=log)
+        sim.start()
+
+    events = list(read_events(path))
+    num_ids = next(sim.individual_ids)
+    assert all(0 <= target_id < num_ids for _, _, target_id, _ in events)
+    assert all(
+        source_id == NO_SOURCE or 0 <= source_id < num_ids
+        for _, source_id, _, _ in events
+    )
+    assert any(event_type == EVENT_INFECTION for *_, event_type in events)
+
+    # one birth event per parent, one child per id drawn after the initial population
+    children = [
+        target_id
+        for _, _, target_id, event_type in events
+        if event_type == EVENT_BIRTH
+    ]
+    assert sorted(set(children)) == list(range(60, num_ids))
+    assert all(children.count(child) == 2 for child in set(children))
@@ -0,0 +1,38 @@
+import random
+import struct
+import zlib
+
+import pytest
+
+import main
+
+np = pytest.importorskip("numpy")
+raster = pytest.importorskip("raster")
+
+
+def test_write_png(tmp_path):
+    random.seed(3)
+    sim = main.Simulation(num_ticks=2)
+    sim.start()
+    image = raster.render_frame(sim, 40, 30)
+    path = tmp_path / "frame.png"
+    raster.write_png(path, image)
+
+    data = path.read_bytes()
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    chunks = {}
+    offset = 8
+    while offset < len(data):
+        (length,) = struct.unpack(">I", data[offset : offset + 4])
+        chunk_type = data[offset + 4 : offset + 8]
+        chunk_data = data[offset + 8 : offset + 8 + length]
+        (crc,) = struct.unpack(">I", data[offset + 8 + length : offset + 12 + length])
+        assert crc == zlib.crc32(chunk_type + chunk_data)
+        chunks[chunk_type] = chunk_data
+        offset += 12 + length
+
+    assert struct.unpack(">IIBBBBB", chunks[b"IHDR"]) == (40, 30, 8, 2, 0, 0, 0)
+    scanlines = np.frombuffer(zlib.decompress(chunks[b"IDAT"]), dtype=np.uint8)
+    scanlines = scanlines.reshape(30, 40 * 3 + 1)
+    assert (scanlines[:, 0] == 0).all()
+    assert (scanlines[:, 1:].reshape(30, 40, 3) == image).all()
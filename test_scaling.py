@@ -0,0 +1,83 @@
+import pytest
+
+scaling = pytest.importorskip("scaling")
+
+
+def make_case(num_individuals, num_ticks):
+    peak_population = 3 * num_individuals * num_ticks
+    seconds = 1e-6 * peak_population**2 * num_ticks
+    return {
+        "num_individuals": num_individuals,
+        "num_ticks": num_ticks,
+        "peak_population": peak_population,
+        "seconds": seconds,
+        "seconds_per_tick": seconds / num_ticks,
+        "rss_growth_bytes": 50 * peak_population,
+        "traced_peak_bytes": 100 * peak_population,
+        "live_blocks": 7 * peak_population,
+        "new_blocks_per_tick": 2 * peak_population,
+    }
+
+
+def test_fit_exponent_finds_known_slope():
+    xs = [1, 2, 4, 8, 16]
+    assert scaling.fit_exponent(xs, [3 * x**2 for x in xs]) == pytest.approx(2)
+    assert scaling.fit_exponent(xs, [5 / x for x in xs]) == pytest.approx(-1)
+
+
+@pytest.mark.parametrize(
+    "xs, ys",
+    [
+        ([], []),
+        ([10], [4]),
+        # points with a non-positive coordinate have no logarithm
+        ([10, 20, 0], [4, 0, 8]),
+        ([10, 10, 10], [1, 2, 3]),
+    ],
+)
+def test_fit_exponent_needs_two_distinct_points(xs, ys):
+    assert scaling.fit_exponent(xs, ys) is None
+
+
+def test_get_exponents():
+    cases = [make_case(n, t) for t in (2, 4, 8) for n in (10, 20, 40)]
+    exponents = scaling.get_exponents(cases)
+
+    expected = {
+        "seconds_per_tick": 2,
+        "rss_growth": 1,
+        "traced_peak": 1,
+        "live_blocks": 1,
+        "new_blocks_per_tick": 1,
+        "peak_population": 1,
+        "seconds_over_ticks": 3,
+        "traced_peak_over_ticks": 1,
+    }
+    assert exponents == pytest.approx(expected)
+
+
+def test_get_exponents_with_a_single_tick_count():
+    exponents = scaling.get_exponents([make_case(n, 5) for n in (10, 20, 40)])
+
+    assert exponents["seconds_per_tick"] == pytest.approx(2)
+    assert exponents["seconds_over_ticks"] is None
+
+
+def test_check_thresholds():
+    thresholds = {
+        "exponents": {"seconds_per_tick": 2.0, "traced_peak": 1.5, "live_blocks": 1},
+        "bytes_per_individual": 300,
+    }
+    report = {
+        "exponents": {"seconds_per_tick": 2.5, "traced_peak": 1.0, "live_blocks": None},
+        "bytes_per_individual": 400,
+    }
+
+    failures = scaling.check_thresholds(report, thresholds)
+    assert len(failures) == 2
+    assert failures[0].startswith("exponent seconds_per_tick = 2.500 > 2.0")
+    assert failures[1].startswith("bytes_per_individual = 400 > 300")
+
+    report["exponents"]["seconds_per_tick"] = 2.0
+    report["bytes_per_individual"] = 300
+    assert scaling.check_thresholds(report, thresholds) == []
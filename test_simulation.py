@@ -0,0 +1,244 @@
+import copy
+import random
+from array import array
+
+import pytest
+
+import main
+
+
+def make_quiescent_simulation(seed, num_individuals=40):
+    random.seed(seed)
+    sim = main.Simulation(num_ticks=45, num_individuals=num_individuals)
+    for i, individual in enumerate(sim.individuals):
+        individual.state = "ZZ"
+        individual.reset_state_duration()
+        # a single child reaches the reproductive age alone, nobody else can
+        individual.age = 3 + seed % 10 if i == 0 else 41 + (i * 7 + seed) % 40
+        individual.immunity = individual.get_max_immunity()
+
+    return sim
+
+
+def run(sim, seed=99, steps=None):
+    random.seed(seed)
+    ticks = 0
+    while ticks < sim.num_ticks:
+        step = sim.advance(sim.num_ticks - ticks)
+        ticks += step
+        if steps is not None:
+            steps.append(step)
+    sim.finish()
+
+    individuals = sorted(
+        (
+            individual.id,
+            individual.state,
+            individual.age,
+            individual.immunity,
+            individual.x_pos,
+            individual.y_pos,
+            individual.x_direction,
+            individual.y_direction,
+        )
+        for individual in sim.individuals
+    )
+    cohorts = sorted((key, sorted(ids)) for key, ids in sim.cohorts.items())
+
+    return individuals, cohorts
+
+
+def test_move_position_matches_update_position():
+    rng = random.Random(1)
+    for _ in range(2000):
+        individual = main.Individual()
+        individual.x_direction, individual.y_direction = main.get_random_direction(
+            rng=rng
+        )
+        position = (
+            individual.x_pos,
+            individual.x_direction,
+            individual.y_pos,
+            individual.y_direction,
+        )
+        for _ in range(rng.randint(1, 200)):
+            position = main.move_position(*position, individual.speed)
+            individual.update_position()
+
+        assert position == (
+            individual.x_pos,
+            individual.x_direction,
+            individual.y_pos,
+            individual.y_direction,
+        )
+
+
+@pytest.mark.parametrize("age", [0, 10, 14, 30, 39, 50, 69, 80])
+def test_advance_immunity_matches_update_immunity(age):
+    for immunity in (0.5, 2.9, 5.5, 9.99):
+        individual = main.Individual(birth=True, parent_x_pos=50, parent_y_pos=50)
+        individual.age = age
+        individual.immunity = immunity
+        ticks = main.MAX_AGE - 1 - age
+        for _ in range(ticks):
+            individual.age += 1
+            individual.update_immunity()
+
+        assert main.advance_immunity(immunity, age, ticks) == pytest.approx(
+            individual.immunity
+        )
+
+
+@pytest.mark.parametrize("compress_cohorts", [False, True])
+@pytest.mark.parametrize("seed", range(10))
+def test_adaptive_stepping_matches_daily_stepping(seed, compress_cohorts):
+    daily = make_quiescent_simulation(seed)
+    daily.compress_cohorts = compress_cohorts
+    adaptive = copy.deepcopy(daily)
+    adaptive.adaptive_stepping = True
+
+    steps = []
+    assert run(adaptive, steps=steps) == run(daily)
+    assert max(steps) > 1
+
+
+def test_adaptive_stepping_waits_for_maximum_immunity():
+    sim = make_quiescent_simulation(0)
+    sim.individuals[1].immunity = 1.0
+    sim.adaptive_stepping = True
+
+    # immunity is still shared, so the next day is simulated
+    assert sim.get_quiescent_ticks(45) == 0
+    assert sim.advance(45) == 1
+    assert sim.individuals[1].immunity == sim.individuals[1].get_max_immunity()
+
+
+def make_cohort_simulation(ages, seed=0):
+    random.seed(seed)
+    sim = main.Simulation(compress_cohorts=True, num_individuals=len(ages))
+    for individual, age in zip(sim.individuals, ages):
+        individual.state = "ZZ"
+        individual.reset_state_duration()
+        individual.age = age
+        individual.immunity = individual.get_max_immunity()
+
+    return sim
+
+
+def get_ids(sim):
+    ids = [individual.id for individual in sim.individuals]
+    for cohort_ids in sim.cohorts.values():
+        ids.extend(cohort_ids)
+
+    return sorted(ids)
+
+
+def add_individual(sim, state, x_pos, y_pos, age=50):
+    individual = main.Individual(birth=True, parent_x_pos=x_pos, parent_y_pos=y_pos)
+    individual.state = state
+    individual.reset_state_duration()
+    individual.age = age
+    sim.individuals.append(individual)
+
+    return individual
+
+
+@pytest.mark.parametrize("age", [0, 13, 14, 38, 39, 68, 69, 95])
+def test_update_cohorts_matches_individual_update(age):
+    for immunity in (0.5, 2.98, 5.5, 9.99):
+        individual = main.Individual(birth=True, parent_x_pos=50, parent_y_pos=50)
+        individual.age = age
+        individual.immunity = immunity
+        sim = main.Simulation(compress_cohorts=True, num_individuals=0)
+        sim.cohorts = {(5, 5, age, immunity): array("q", [individual.id])}
+
+        for _ in range(main.MAX_AGE - age):
+            individual.update()
+            sim.update_cohorts()
+            if individual.is_alive():
+                assert list(sim.cohorts) == [
+                    (5, 5, individual.age, individual.immunity)
+                ]
+
+        # the cohort dies at MAX_AGE together with the individual
+        assert not individual.is_alive()
+        assert sim.cohorts == {}
+
+
+def test_compression_keeps_population_and_ids():
+    sim = make_cohort_simulation([5 + i % 90 for i in range(200)])
+    ids = get_ids(sim)
+
+    sim.rebalance_cohorts()
+    assert sim.cohorts
+    assert all(not 20 <= age <= 40 for _, _, age, _ in sim.cohorts)
+    assert sim.get_population() == 200
+    assert get_ids(sim) == ids
+
+    # everything is down and to the left of an ill individual in the top right corner
+    ill = add_individual(sim, "C", main.GRID_WIDTH - 1, main.GRID_HEIGHT - 1)
+    sim.rebalance_cohorts()
+    assert sim.cohorts == {}
+    assert sim.get_population() == 201
+    assert get_ids(sim) == sorted(ids + [ill.id])
+
+
+def test_rebalance_expands_only_reachable_regions():
+    sim = main.Simulation(compress_cohorts=True, num_individuals=0)
+    immunity = main.get_max_immunity(50)
+    for region in ((0, 0), (2, 2), (3, 0), (0, 3), (8, 8)):
+        sim.cohorts[(*region, 50, immunity)] = array("q", [next(sim.individual_ids)])
+
+    # reaches up to 20 + INFECTION_RADIUS + max(SPEED_VALUES) = 25, region 2
+    add_individual(sim, "Z", 20, 20)
+    sim.rebalance_cohorts()
+
+    assert sorted(key[:2] for key in sim.cohorts) == [(0, 3), (3, 0), (8, 8)]
+    for individual in sim.individuals[1:]:
+        assert individual.x_pos < 30 and individual.y_pos < 30
+        assert individual.age == 50 and individual.immunity == immunity
+
+
+def test_rebalance_expands_reproductive_age():
+    sim = main.Simulation(compress_cohorts=True, num_individuals=0)
+    for age in (19, 20, 40, 41):
+        immunity = main.get_max_immunity(age)
+        sim.cohorts[(8, 8, age, immunity)] = array("q", [next(sim.individual_ids)])
+
+    sim.rebalance_cohorts()
+
+    assert sorted(key[2] for key in sim.cohorts) == [19, 41]
+    assert sorted(individual.age for individual in sim.individuals) == [20, 40]
+
+
+def make_two_phase_simulation(num_workers, executor="thread"):
+    random.seed(5)
+    return main.Simulation(
+        num_ticks=6,
+        interaction_mode="two_phase",
+        num_workers=num_workers,
+        executor=executor,
+        seed=11,
+    )
+
+
+def test_two_phase_does_not_depend_on_workers():
+    expected = run(make_two_phase_simulation(1))
+
+    assert run(make_two_phase_simulation(3)) == expected
+    assert run(make_two_phase_simulation(2, executor="process")) == expected
+
+
+def test_same_seed_gives_same_run():
+    assert run(make_two_phase_simulation(1)) == run(make_two_phase_simulation(1))
+
+
+def test_context_manager_stops_workers():
+    with make_two_phase_simulation(2) as sim:
+        sim.update()
+        pool = sim.pool
+        assert pool is not None
+
+    assert sim.pool is None
+    with pytest.raises(RuntimeError):
+        pool.submit(print)